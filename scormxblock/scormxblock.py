@@ -1,19 +1,23 @@
 import concurrent.futures
+import glob
 import json
 import hashlib
+import itertools
 import mimetypes
-import re
 import os
-import stat
 import logging
 import pkg_resources
 import shutil
+import uuid
 import xml.etree.ElementTree as ET
+import zipfile
 
 from django.conf import settings
+from django.core.files import File
 from django.core.files.storage import default_storage
 from django.template import Context, Template
 from django.utils import timezone
+from django.utils.functional import cached_property
 from webob import Response
 from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
 
@@ -22,6 +26,17 @@ from xblock.core import XBlock
 from xblock.fields import Scope, String, Float, Boolean, Dict, DateTime, Integer
 from xblock.fragment import Fragment
 
+try:
+    from boto3.s3.transfer import TransferConfig, create_transfer_manager
+    from storages.utils import clean_name, safe_join
+except ImportError:
+    TransferConfig = safe_join = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 # Make '_' a no-op so we can scrape strings
 _ = lambda text: text
@@ -31,8 +46,39 @@ log = logging.getLogger(__name__)
 SCORM_ROOT = os.path.join(settings.MEDIA_ROOT, "scormxblockmedia")
 SCORM_URL = os.path.join(settings.MEDIA_URL, "scormxblockmedia")
 MAX_WORKERS = getattr(settings, "THREADPOOLEXECUTOR_MAX_WORKERS", 10)
+# S3Boto3Storage keeps a boto3 connection per thread, keep the number of upload threads low
+S3_UPLOAD_CONCURRENCY = getattr(settings, "SCORM_S3_UPLOAD_CONCURRENCY", MAX_WORKERS)
+# A transfer manager shares a single boto3 client between its threads, it can run many more
+S3_TRANSFER_CONCURRENCY = getattr(settings, "SCORM_S3_TRANSFER_CONCURRENCY", 64)
+COPY_BUFFER_SIZE = 1024 * 1024
+# Removes outdated local copies of scorm packages without blocking the request
+CLEANUP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+# Content types and encodings of the uploaded files, by chain of extensions
+CONTENT_TYPES = {}
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=S3_TRANSFER_CONCURRENCY,
+    use_threads=True,
+) if TransferConfig else None
 ENABLE_PUBLISH_FAILED_SCORM_SCORE = settings.FEATURES.get('ENABLE_PUBLISH_FAILED_SCORM_SCORE', False)
 
+# Static assets are read once at import, templates are compiled on first render
+# (the django template engine may not be ready yet when this module is imported)
+_ASSET_PATHS = (
+    "static/html/scormxblock.html",
+    "static/html/studio.html",
+    "static/html/author_view.html",
+    "static/css/scormxblock.css",
+    "static/js/src/scormxblock.js",
+    "static/js/src/studio.js",
+)
+_ASSETS = {
+    path: pkg_resources.resource_string(__name__, path).decode("utf8")
+    for path in _ASSET_PATHS
+}
+_TEMPLATES = {}
+
 
 class ScormXBlock(XBlock, CompletableXBlockMixin):
     display_name = String(
@@ -50,6 +96,8 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
         scope=Scope.settings,
     )
     scorm_file_meta = Dict(scope=Scope.content)
+    # Setting version_scorm, lesson_status or success_status must be followed by a call to
+    # `_reset_status_cache`, the completion status derived from them is cached on the instance
     version_scorm = String(
         default="SCORM_12",
         scope=Scope.settings,
@@ -59,6 +107,8 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
     success_status = String(scope=Scope.user_state, default="unknown")
     data_scorm = Dict(scope=Scope.user_state, default={})
     lesson_score = Float(scope=Scope.user_state, default=0)
+    # last grade published to the runtime, to skip publishing the same grade again
+    published_grade = Dict(scope=Scope.user_state, default={})
     weight = Float(default=1, scope=Scope.settings)
     has_score = Boolean(
         display_name=_("Scored"),
@@ -97,8 +147,9 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
 
     def resource_string(self, path):
         """Handy helper for getting resources from our kit."""
-        data = pkg_resources.resource_string(__name__, path)
-        return data.decode("utf8")
+        if path not in _ASSETS:
+            _ASSETS[path] = pkg_resources.resource_string(__name__, path).decode("utf8")
+        return _ASSETS[path]
 
     def student_view(self, context=None):
         context_html = self.get_context_student()
@@ -125,25 +176,35 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
         return frag
 
     def _delete_local_storage(self):
+        """
+        Move the local storage out of the way and delete it in the background.
+
+        Copies left behind by a worker that stopped before deleting them are swept on the next call.
+        """
         path = self.local_storage_path
-        if os.path.exists(path):
-            shutil.rmtree(path)
+        for stale_path in glob.glob("{}.trash.*".format(glob.escape(path))):
+            CLEANUP_EXECUTOR.submit(shutil.rmtree, stale_path, ignore_errors=True)
 
-    @property
+        trash_path = "{}.trash.{}".format(path, uuid.uuid4().hex)
+        try:
+            os.rename(path, trash_path)
+        except FileNotFoundError:
+            # Nothing stored yet, or a concurrent upload moved it first
+            return
+        CLEANUP_EXECUTOR.submit(shutil.rmtree, trash_path, ignore_errors=True)
+
+    # The location of a block never changes, the path derived from it is computed once
+    @cached_property
     def local_storage_path(self):
         return os.path.join(
             SCORM_ROOT, self.location.org, self.location.course, self.location.block_id
         )
 
-    @property
+    # default_storage is configured once per process
+    @cached_property
     def s3_storage(self):
         return "S3" in default_storage.__class__.__name__
 
-    def get_remote_path(self, local_path):
-        return "".join(
-            [self._file_storage_path(), local_path.replace(self.local_storage_path, "")]
-        )
-
     @XBlock.handler
     def studio_submit(self, request, suffix=""):
         self.display_name = request.params["display_name"]
@@ -156,17 +217,34 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
         if hasattr(request.params["file"], "file"):
             scorm_file = request.params["file"].file
 
+            zip_path, sha1, size = self._materialize_and_hash(scorm_file)
+            try:
+                self._unpack_files(zip_path)
+            except Exception:
+                log.exception('"{}" could not be extracted'.format(scorm_file.name))
+                message = _(
+                    "The scorm package could not be extracted, make sure it is a valid zip file."
+                )
+                return Response(
+                    self._dumps({"result": "error", "message": message}),
+                    status=400,
+                    content_type="application/json",
+                    charset="utf8",
+                )
+            finally:
+                # Do not leave the staged copy behind when the extraction fails
+                if not hasattr(scorm_file, "temporary_file_path"):
+                    os.remove(zip_path)
+
             # First, save scorm file in the storage for mobile clients
-            self.scorm_file_meta["sha1"] = self.get_sha1(scorm_file)
+            self.scorm_file_meta["sha1"] = sha1
             self.scorm_file_meta["name"] = scorm_file.name
             self.scorm_file_meta["path"] = self._file_storage_path()
             self.scorm_file_meta["last_updated"] = timezone.now().strftime(
                 DateTime.DATETIME_FORMAT
             )
-            self.scorm_file_meta["size"] = scorm_file.size
+            self.scorm_file_meta["size"] = size
 
-            self._unpack_files(scorm_file)
-            self.update_subdir_permissions()
             self.set_fields_xblock()
             if self.s3_storage:
                 self._store_unziped_files_to_s3()
@@ -175,108 +253,297 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
 
         # changes made for juniper (python 3.5)
         return Response(
-            json.dumps({"result": "success"}),
+            self._dumps({"result": "success"}),
             content_type="application/json",
             charset="utf8",
         )
 
-    def update_subdir_permissions(self):
+    def _dumps(self, data):
         """
-        Extends existing permissions of all the the sub-directories with the Owner Execute permission (S_IXUSR).
-
-        All sub-directories of the scorm-package must have executable permissions for the Directory Owner otherwise
-        Studio will raise Permission Denied error on scorm package upload.
+        Serialize data to JSON with orjson when it is installed.
         """
-        for path, subdirs, files in os.walk(self.local_storage_path):
-            for name in subdirs:
-                dir_path = os.path.join(path, name)
-                st = os.stat(dir_path)
-                os.chmod(dir_path, st.st_mode | stat.S_IXUSR)
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data)
 
-    def _unpack_files(self, scorm_file):
+    def _materialize_and_hash(self, scorm_file):
         """
-        Unpacks zip file using unzip system utility
-        """
-        # Now unpack it into SCORM_ROOT to serve to students later
-        self._delete_local_storage()
-        local_path = self.local_storage_path
-        os.makedirs(local_path)
+        Get the uploaded zip file on the local disk along with its hex digest (fingerprint) and size.
 
+        The upload is read only once: files already stored in a temporary file are hashed in place,
+        the other ones are hashed while being copied under SCORM_ROOT.
+        """
         if hasattr(scorm_file, "temporary_file_path"):
-            os.system(
-                "unzip {} -d {}".format(scorm_file.temporary_file_path(), local_path)
-            )
+            zip_path = scorm_file.temporary_file_path()
+            with open(zip_path, "rb") as zip_file:
+                if hasattr(hashlib, "file_digest"):
+                    # python >= 3.11 hashes the whole file in C without any per-block python overhead
+                    sha1 = hashlib.file_digest(zip_file, "sha1")
+                else:
+                    sha1 = hashlib.sha1()
+                    for chunk in self._read_chunks(zip_file):
+                        sha1.update(chunk)
+                size = os.fstat(zip_file.fileno()).st_size
         else:
-            temporary_path = os.path.join(SCORM_ROOT, scorm_file.name)
-            temporary_zip = open(temporary_path, "wb")
+            # SCORM_ROOT does not exist yet on a fresh install
+            os.makedirs(SCORM_ROOT, exist_ok=True)
+            zip_path = os.path.join(SCORM_ROOT, scorm_file.name)
+            sha1 = hashlib.sha1()
+            size = 0
             scorm_file.open()
-            temporary_zip.write(scorm_file.read())
-            temporary_zip.close()
-            os.system("unzip {} -d {}".format(temporary_path, local_path))
-            os.remove(temporary_path)
+            with open(zip_path, "wb") as temporary_zip:
+                for chunk in self._read_chunks(scorm_file):
+                    sha1.update(chunk)
+                    temporary_zip.write(chunk)
+                    size += len(chunk)
+        return zip_path, sha1.hexdigest(), size
+
+    def _read_chunks(self, file_descriptor):
+        """
+        Yield the content of the file in COPY_BUFFER_SIZE blocks.
+        """
+        # changes made for juniper (python 3.5)
+        while True:
+            chunk = file_descriptor.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            yield chunk
 
-    def _fix_content_type(self, file_path):
+    def _unpack_files(self, zip_path):
         """
-        Sometimes content type of file returned by mimetypes module is bytes object instead of string
-        which fails content type validation of boto3 and boto3 would not upload file instead throws
-        `botocore.exceptions.ParamValidationError: Parameter validation failed:`
-        This method fixes such content types by changing their type from bytes to string
+        Unpacks zip file into the local storage path
+
+        The package is extracted into a sibling staging directory which replaces the local
+        storage only once every member has been written, so the previous package stays in place
+        when the extraction fails.
         """
-        _content_type, __ = mimetypes.guess_type(file_path)
+        local_path = self.local_storage_path
+        staging_path = "{}.staging.{}".format(local_path, uuid.uuid4().hex)
+        os.makedirs(staging_path)
         try:
-            str_type = _content_type.decode("utf-8")
-            ext = file_path.split(".")[-1]
-            mimetypes.add_type(str_type, "." + ext)
-        except (UnicodeDecodeError, AttributeError):
-            pass
+            self._extract_zip(zip_path, staging_path)
+            # Now swap it into SCORM_ROOT to serve to students later
+            self._delete_local_storage()
+            os.replace(staging_path, local_path)
+        except Exception:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            raise
+
+    def _extract_zip(self, zip_path, local_path):
+        """
+        Extracts all the members of the zip file into `local_path` using MAX_WORKERS threads.
+
+        Directories are created upfront so that the workers only have to write regular files.
+        Unlike the unzip utility, zipfile does not restore the permissions stored in the archive,
+        so the sub-directories always keep the Owner Execute permission (S_IXUSR) required by
+        Studio and no extra pass over the extracted tree is needed.
+        """
+        # Target paths are normalized, so must be the root they are checked against
+        local_path = os.path.normpath(local_path)
+        members = []
+        # Most members share their directory, only hit the filesystem once per directory
+        created_dirs = {local_path}
+        with zipfile.ZipFile(zip_path) as zip_file:
+            for info in zip_file.infolist():
+                target_path = os.path.normpath(os.path.join(local_path, info.filename))
+                if not target_path.startswith(local_path + os.sep):
+                    log.warning('Skipping "{}": path is outside of the scorm package'.format(info.filename))
+                    continue
+                if info.filename.endswith("/"):
+                    dir_path = target_path
+                else:
+                    dir_path = os.path.dirname(target_path)
+                    members.append((info, target_path))
+                if dir_path not in created_dirs:
+                    os.makedirs(dir_path, exist_ok=True)
+                    created_dirs.add(dir_path)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            tracker_futures = [
+                executor.submit(self._extract_members, zip_path, members[index::MAX_WORKERS])
+                for index in range(min(MAX_WORKERS, len(members)))
+            ]
+            for future in tracker_futures:
+                future.result()
+
+    def _extract_members(self, zip_path, members):
+        """
+        Writes the given (ZipInfo, target path) pairs to disk.
+
+        Each worker opens its own ZipFile so that reads never share a file position.
+        """
+        with zipfile.ZipFile(zip_path) as zip_file:
+            for info, target_path in members:
+                with zip_file.open(info) as source, open(target_path, "wb") as destination:
+                    shutil.copyfileobj(source, destination)
+
+    def _guess_type(self, file_path):
+        """
+        Get the `(content_type, encoding)` pair of the file, guessed only once per chain of
+        extensions (e.g. ".js.gz" is a gzip encoded javascript file).
+
+        Passing it explicitly to the storage saves every upload worker a mimetypes lookup.
+        """
+        name = os.path.basename(file_path).lower().lstrip(".")
+        ext = name[name.index("."):] if "." in name else ""
+        if ext not in CONTENT_TYPES:
+            content_type, encoding = mimetypes.guess_type("file" + ext)
+            CONTENT_TYPES[ext] = (content_type or "application/octet-stream", encoding)
+        return CONTENT_TYPES[ext]
+
+    def _get_remote_path(self, file_path, remote_prefix, local_root):
+        """
+        Get the storage path of an unzipped file, `remote_prefix` and `local_root` being computed
+        once per package.
+        """
+        return "/".join(
+            [remote_prefix, os.path.relpath(file_path, local_root).replace(os.sep, "/")]
+        )
+
+    def _get_transfer_manager(self):
+        """
+        Get a boto3 TransferManager for the storage bucket.
 
-    def _upload_file(self, file_path):
-        self._fix_content_type(file_path)
-        path = self.get_remote_path(file_path)
+        Returns None when files must go through `default_storage.save`: storages which are not
+        boto3 based, and gzipped storages since the transfer manager does not compress files.
+        """
+        if S3_TRANSFER_CONFIG is None or getattr(default_storage, "gzip", False):
+            return None
+        bucket = getattr(default_storage, "bucket", None)
+        if not (hasattr(bucket, "meta") and hasattr(default_storage, "get_object_parameters")):
+            return None
+        return create_transfer_manager(bucket.meta.client, S3_TRANSFER_CONFIG)
+
+    def _upload_one(self, file_path, remote_prefix, local_root):
+        """
+        Upload a single unzipped file through the storage.
+        """
+        path = self._get_remote_path(file_path, remote_prefix, local_root)
         with open(file_path, "rb") as content_file:
-            default_storage.save(path, content_file)
+            content = File(content_file)
+            # The storage guesses the encoding from the path itself
+            content.content_type, __ = self._guess_type(file_path)
+            default_storage.save(path, content)
         log.info('S3: "{}" file stored at "{}"'.format(file_path, path))
 
+    def _transfer_one(self, transfer_manager, file_path, remote_prefix, local_root):
+        """
+        Submit the upload of a single unzipped file to the transfer manager, which sends large
+        files as parallel multipart chunks. Returns the transfer future.
+        """
+        path = self._get_remote_path(file_path, remote_prefix, local_root)
+        # Same key and parameters as S3Boto3Storage.save would use
+        key = safe_join(default_storage.location, clean_name(path))
+        extra_args = default_storage.get_object_parameters(key)
+        if "ContentType" not in extra_args:
+            extra_args["ContentType"], encoding = self._guess_type(file_path)
+            if encoding:
+                extra_args["ContentEncoding"] = encoding
+        if default_storage.default_acl and "ACL" not in extra_args:
+            extra_args["ACL"] = default_storage.default_acl
+        future = transfer_manager.upload(
+            file_path, default_storage.bucket.name, key, extra_args=extra_args
+        )
+        log.info('S3: "{}" file submitted for upload at "{}"'.format(file_path, key))
+        return future
+
     def _delete_existing_files(self, path):
         """
-        Recusively delete all files under given path
+        Delete all files under given path
+
+        boto3 backed storages remove the whole prefix with batched DeleteObjects requests
+        (up to 1000 keys each), other storages are traversed recursively.
         """
-        dir_names, file_names = default_storage.listdir(path)
+        bucket = getattr(default_storage, "bucket", None)
+        if safe_join is not None and hasattr(bucket, "objects"):
+            # Same key as the uploaded files, see _transfer_one
+            key = safe_join(default_storage.location, clean_name(path))
+            prefix = "{}/".format(key.rstrip("/"))
+            bucket.objects.filter(Prefix=prefix).delete()
+            log.info('S3: files under "{}" deleted'.format(prefix))
+            return
+
         with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            tracker_futures = []
-            for file_name in file_names:
-                file_path = "/".join([path, file_name])
-                tracker_futures.append(
-                    executor.submit(default_storage.delete, file_path)
-                )
-                log.info('S3: "{}" file deleted'.format(file_path))
+            self._delete_files_recursively(path, executor)
+
+    def _delete_files_recursively(self, path, executor):
+        """
+        Recusively submit the deletion of all files under given path to the shared executor
+        """
+        dir_names, file_names = default_storage.listdir(path)
+        for file_name in file_names:
+            file_path = "/".join([path, file_name])
+            executor.submit(default_storage.delete, file_path)
+            log.info('S3: "{}" file deleted'.format(file_path))
 
         for dir_name in dir_names:
             dir_path = "/".join([path, dir_name])
-            self._delete_existing_files(dir_path)
+            self._delete_files_recursively(dir_path, executor)
 
     def _store_unziped_files_to_s3(self):
-        """"""
-        self._delete_existing_files(self._file_storage_path())
-        local_path = self.local_storage_path
-        file_paths = []
-        for path, subdirs, files in os.walk(local_path):
-            for name in files:
-                file_paths.append(os.path.join(path, name))
+        """
+        Upload the unzipped files to S3.
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        boto3 storages go through a single transfer manager whose `max_concurrency` is
+        S3_TRANSFER_CONCURRENCY. Other storages use a pool of S3_UPLOAD_CONCURRENCY threads,
+        where a new upload is submitted as soon as any pending one finishes, so a single slow
+        request never holds back the rest of the package.
+        """
+        remote_prefix = self._file_storage_path()
+        local_root = self.local_storage_path
+        self._delete_existing_files(remote_prefix)
+        file_paths = self._iter_local_files()
+
+        transfer_manager = self._get_transfer_manager()
+        if transfer_manager is not None:
+            with transfer_manager:
+                self._transfer_files(transfer_manager, file_paths, remote_prefix, local_root)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=S3_UPLOAD_CONCURRENCY) as executor:
             tracker_futures = {
-                executor.submit(self._upload_file, file_path): file_path
-                for file_path in file_paths
+                executor.submit(self._upload_one, file_path, remote_prefix, local_root): file_path
+                for file_path in itertools.islice(file_paths, S3_UPLOAD_CONCURRENCY)
             }
-            for future in concurrent.futures.as_completed(tracker_futures):
-                file_path = tracker_futures[future]
-                try:
-                    future.result()
-                except Exception as exc:
-                    log.info(
-                        "S3: upload of %r generated an exception: %s" % (file_path, exc)
-                    )
+            while tracker_futures:
+                done, __ = concurrent.futures.wait(
+                    tracker_futures, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    file_path = tracker_futures.pop(future)
+                    self._wait_for_upload(future, file_path)
+                for file_path in itertools.islice(file_paths, len(done)):
+                    future = executor.submit(self._upload_one, file_path, remote_prefix, local_root)
+                    tracker_futures[future] = file_path
+
+    def _transfer_files(self, transfer_manager, file_paths, remote_prefix, local_root):
+        """
+        Upload the files through a single transfer manager, shared by the whole package.
+
+        Every file is submitted right away: the manager runs at most `max_concurrency`
+        requests at once and blocks the submission when its own queue is full, so a new upload
+        starts as soon as any pending one finishes.
+        """
+        tracker_futures = [
+            (self._transfer_one(transfer_manager, file_path, remote_prefix, local_root), file_path)
+            for file_path in file_paths
+        ]
+        for future, file_path in tracker_futures:
+            self._wait_for_upload(future, file_path)
+
+    def _wait_for_upload(self, future, file_path):
+        try:
+            future.result()
+        except Exception as exc:
+            log.error("S3: upload of %r generated an exception: %s" % (file_path, exc))
+
+    def _iter_local_files(self):
+        """
+        Yield the path of every unzipped file while the local storage is being walked.
+        """
+        for path, subdirs, files in os.walk(self.local_storage_path):
+            for name in files:
+                yield os.path.join(path, name)
 
     @XBlock.json_handler
     def scorm_get_value(self, data, suffix=""):
@@ -294,9 +561,12 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
     def scorm_set_value(self, data, suffix=""):
         context = {"result": "success"}
         name = data.get("name")
+        # CMI values buffered by the SCORM API since the last commit
+        self.data_scorm.update(data.get("values", {}))
 
         if name in ["cmi.core.lesson_status", "cmi.completion_status"]:
             self.lesson_status = data.get("value")
+            self._reset_status_cache()
             if self.has_score and data.get("value") in [
                 "completed",
                 "failed",
@@ -307,6 +577,7 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
 
         elif name == "cmi.success_status":
             self.success_status = data.get("value")
+            self._reset_status_cache()
             if self.has_score:
                 if self.success_status == "unknown":
                     self.lesson_score = 0
@@ -319,6 +590,21 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
         else:
             self.data_scorm[name] = data.get("value", "")
 
+        return self._complete_set_value(context)
+
+    @XBlock.json_handler
+    def scorm_set_values(self, data, suffix=""):
+        """
+        Store the CMI values buffered by the SCORM API until a commit, in a single field write.
+
+        Status and score values are never buffered, they go through `scorm_set_value` along with
+        the values pending at that time.
+        """
+        context = {"result": "success"}
+        self.data_scorm.update(data.get("values", {}))
+        return self._complete_set_value(context)
+
+    def _complete_set_value(self, context):
         completion_status = self.get_completion_status()
         context.update({"completion_status": completion_status})
 
@@ -331,26 +617,18 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
     def publish_grade(self):
         if not ENABLE_PUBLISH_FAILED_SCORM_SCORE and (
             self.lesson_status == "failed" or (
-                self.version_scorm == "SCORM_2004" and self.success_status in ["failed", "unknown"]
+                self._is_scorm_2004 and self.success_status in ["failed", "unknown"]
             )
         ):
-            self.runtime.publish(
-                self,
-                "grade",
-                {
-                    "value": 0,
-                    "max_value": self.weight,
-                },
-            )
+            grade = {"value": 0, "max_value": self.weight}
         else:
-            self.runtime.publish(
-                self,
-                "grade",
-                {
-                    "value": self.lesson_score,
-                    "max_value": self.weight,
-                },
-            )
+            grade = {"value": self.lesson_score, "max_value": self.weight}
+
+        # SCORM contents commonly post the same status several times
+        if grade == self.published_grade:
+            return
+        self.runtime.publish(self, "grade", grade)
+        self.published_grade = grade
 
     def max_score(self):
         """
@@ -384,50 +662,29 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
         }
 
     def render_template(self, template_path, context):
-        template_str = self.resource_string(template_path)
-        template = Template(template_str)
-        return template.render(Context(context))
+        if template_path not in _TEMPLATES:
+            _TEMPLATES[template_path] = Template(self.resource_string(template_path))
+        return _TEMPLATES[template_path].render(Context(context))
 
     def set_fields_xblock(self):
 
         self.path_index_page = "index.html"
         try:
-            tree = ET.parse("{}/imsmanifest.xml".format(self.local_storage_path))
+            resource, schemaversion = self._parse_manifest(
+                "{}/imsmanifest.xml".format(self.local_storage_path)
+            )
         except IOError:
             pass
         else:
-            namespace = ""
-            for node in [
-                node
-                for _, node in ET.iterparse(
-                    "{}/imsmanifest.xml".format(self.local_storage_path),
-                    events=["start-ns"],
-                )
-            ]:
-                if node[0] == "":
-                    namespace = node[1]
-                    break
-            root = tree.getroot()
-
-            if namespace:
-                resource = root.find(
-                    "{{{0}}}resources/{{{0}}}resource".format(namespace)
-                )
-                schemaversion = root.find(
-                    "{{{0}}}metadata/{{{0}}}schemaversion".format(namespace)
-                )
-            else:
-                resource = root.find("resources/resource")
-                schemaversion = root.find("metadata/schemaversion")
-
             if resource is not None:
                 self.path_index_page = resource.get("href")
             if (schemaversion is not None) and (
-                re.match("^1.2$", schemaversion.text) is None
+                schemaversion.strip() != "1.2"
             ):
                 self.version_scorm = "SCORM_2004"
             else:
                 self.version_scorm = "SCORM_12"
+            self._reset_status_cache()
 
         self.scorm_file = os.path.join(
             SCORM_URL,
@@ -439,12 +696,73 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
             ),
         )
 
+    def _parse_manifest(self, manifest_path):
+        """
+        Find the `resources/resource` and `metadata/schemaversion` elements of the manifest
+        in a single streaming pass.
+
+        Returns the attributes of the first resource and the text of the first schema version,
+        each one being None when missing from the manifest.
+        """
+        namespace = None
+        ancestors = []
+        resource = schemaversion = None
+        found_resource = found_schemaversion = False
+        with open(manifest_path, "rb") as manifest:
+            for event, node in ET.iterparse(manifest, events=("start-ns", "start", "end")):
+                if event == "start-ns":
+                    if namespace is None and node[0] == "":
+                        namespace = node[1]
+                    continue
+                if event == "start":
+                    ancestors.append(node.tag)
+                    continue
+
+                ancestors.pop()
+                if len(ancestors) == 2:
+                    prefix = "{{{0}}}".format(namespace) if namespace else ""
+                    if (
+                        not found_resource
+                        and ancestors[1] == prefix + "resources"
+                        and node.tag == prefix + "resource"
+                    ):
+                        resource = dict(node.attrib)
+                        found_resource = True
+                    elif (
+                        not found_schemaversion
+                        and ancestors[1] == prefix + "metadata"
+                        and node.tag == prefix + "schemaversion"
+                    ):
+                        schemaversion = node.text
+                        found_schemaversion = True
+                node.clear()
+                if found_resource and found_schemaversion:
+                    break
+        return resource, schemaversion
+
     def get_completion_status(self):
+        return self._completion_status
+
+    @cached_property
+    def _completion_status(self):
         completion_status = self.lesson_status
-        if self.version_scorm == "SCORM_2004" and self.success_status != "unknown":
+        if self._is_scorm_2004 and self.success_status != "unknown":
             completion_status = self.success_status
         return completion_status
 
+    @cached_property
+    def _is_scorm_2004(self):
+        return self.version_scorm == "SCORM_2004"
+
+    def _reset_status_cache(self):
+        """
+        Drop the cached values derived from `lesson_status`, `success_status` and `version_scorm`.
+
+        Must be called whenever one of these fields is set.
+        """
+        self.__dict__.pop("_completion_status", None)
+        self.__dict__.pop("_is_scorm_2004", None)
+
     def _file_storage_path(self):
         """
         Get file path of storage.
@@ -454,21 +772,6 @@ class ScormXBlock(XBlock, CompletableXBlockMixin):
         )
         return path
 
-    def get_sha1(self, file_descriptor):
-        """
-        Get file hex digest (fingerprint).
-        """
-        block_size = 8 * 1024
-        sha1 = hashlib.sha1()
-        # changes made for juniper (python 3.5)
-        while True:
-            block = file_descriptor.read(block_size)
-            if not block:
-                break
-            sha1.update(block)
-        file_descriptor.seek(0)
-        return sha1.hexdigest()
-
     def student_view_data(self):
         """
         Inform REST api clients about original file location and it's "freshness".
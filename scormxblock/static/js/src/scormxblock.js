@@ -7,14 +7,14 @@ function ScormXBlock(runtime, element, settings) {
     };
 
     this.LMSFinish = function() {
-      return "true";
+      return CommitValues();
     };
 
     this.LMSGetValue = GetValue;
     this.LMSSetValue = SetValue;
 
     this.LMSCommit = function() {
-        return "true";
+        return CommitValues();
     };
 
     this.LMSGetLastError = function() {
@@ -36,14 +36,14 @@ function ScormXBlock(runtime, element, settings) {
     };
 
     this.Terminate = function() {
-      return "true";
+      return CommitValues();
     };
 
     this.GetValue = GetValue;
     this.SetValue = SetValue;
 
     this.Commit = function() {
-        return "true";
+        return CommitValues();
     };
 
     this.GetLastError = function() {
@@ -59,7 +59,98 @@ function ScormXBlock(runtime, element, settings) {
     }
   }
 
+  // Values which drive the grade and the completion are sent right away,
+  // every other value is buffered until the SCORM content commits.
+  var UNBUFFERED_ELEMENTS = [
+    'cmi.core.lesson_status',
+    'cmi.completion_status',
+    'cmi.success_status',
+    'cmi.core.score.raw',
+    'cmi.score.raw'
+  ];
+  var pendingValues = {};
+  var hasPendingValues = false;
+  var pendingSize = 0;
+  // Browsers reject keepalive requests with a body larger than 64KiB
+  var KEEPALIVE_MAX_BODY_SIZE = 60000;
+  // Large values are committed as soon as they are set rather than when the page
+  // is dismissed, where the request could not use keepalive anymore.
+  var EAGER_COMMIT_SIZE = KEEPALIVE_MAX_BODY_SIZE / 2;
+
+  var UpdateStatus = function (response) {
+    if (typeof response.lesson_score != "undefined"){
+      $(".lesson_score", element).html(response.lesson_score);
+    }
+    $(".completion_status", element).html(response.completion_status);
+  };
+
+  var ValueSize = function (cmi_element, value) {
+    return new Blob([JSON.stringify(cmi_element), JSON.stringify(value)]).size;
+  };
+
+  var TakePendingValues = function () {
+    var values = pendingValues;
+    pendingValues = {};
+    hasPendingValues = false;
+    pendingSize = 0;
+    return values;
+  };
+
+  // Puts back the values of a failed request, unless they were set again since
+  var RestorePendingValues = function (values) {
+    for (var cmi_element in values) {
+      if (values.hasOwnProperty(cmi_element) && !pendingValues.hasOwnProperty(cmi_element)) {
+        pendingValues[cmi_element] = values[cmi_element];
+        pendingSize += ValueSize(cmi_element, values[cmi_element]);
+        hasPendingValues = true;
+      }
+    }
+  };
+
+  var GetCookie = function (name) {
+    var match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+    return match ? decodeURIComponent(match[1]) : null;
+  };
+
+  var CommitValues = function () {
+    if (!hasPendingValues) {
+      return "true";
+    }
+
+    var handlerUrl = runtime.handlerUrl(element, 'scorm_set_values');
+    var values = TakePendingValues();
+    var body = JSON.stringify({'values': values});
+    var headers = {"Content-Type": "application/json"};
+    var csrfToken = GetCookie("csrftoken");
+    if (csrfToken) {
+      headers["X-CSRFToken"] = csrfToken;
+    }
+
+    // Finish/Terminate are commonly called while the page is being dismissed, where
+    // synchronous requests are blocked: keepalive lets the request outlive the page.
+    fetch(handlerUrl, {
+      method: "POST",
+      body: body,
+      headers: headers,
+      credentials: "same-origin",
+      keepalive: new Blob([body]).size < KEEPALIVE_MAX_BODY_SIZE
+    }).then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      return response.json();
+    }).then(UpdateStatus, function () {
+      RestorePendingValues(values);
+    });
+
+    return "true";
+  };
+
   var GetValue = function (cmi_element) {
+    if (pendingValues.hasOwnProperty(cmi_element)) {
+      return pendingValues[cmi_element];
+    }
+
     var handlerUrl = runtime.handlerUrl(element, 'scorm_get_value');
 
     var response = $.ajax({
@@ -77,17 +168,28 @@ function ScormXBlock(runtime, element, settings) {
       $(".js-scorm-block", element).removeClass('full-screen-scorm');
     }
 
+    if (UNBUFFERED_ELEMENTS.indexOf(cmi_element) === -1) {
+      pendingValues[cmi_element] = value;
+      hasPendingValues = true;
+      pendingSize += ValueSize(cmi_element, value);
+      if (pendingSize >= EAGER_COMMIT_SIZE) {
+        CommitValues();
+      }
+      return "true";
+    }
+
     var handlerUrl = runtime.handlerUrl( element, 'scorm_set_value');
 
+    // Buffered values are sent along with the status or score: a separate commit request
+    // would race with this one, both rewriting the same user state.
+    var values = TakePendingValues();
     $.ajax({
       type: "POST",
       url: handlerUrl,
-      data: JSON.stringify({'name': cmi_element, 'value': value}),
-      success: function(response){
-        if (typeof response.lesson_score != "undefined"){
-          $(".lesson_score", element).html(response.lesson_score);
-        }
-        $(".completion_status", element).html(response.completion_status);
+      data: JSON.stringify({'name': cmi_element, 'value': value, 'values': values}),
+      success: UpdateStatus,
+      error: function () {
+        RestorePendingValues(values);
       }
     });
 
@@ -101,6 +203,11 @@ function ScormXBlock(runtime, element, settings) {
       API_1484_11 = new SCORM_2004_API();
     }
 
+    // SCORM contents do not always commit before the learner leaves the page
+    $(window).on("pagehide", function() {
+      CommitValues();
+    });
+
     var $scormBlock = $(".js-scorm-block", element);
     $('.js-button-full-screen', element).on( "click", function() {
       $scormBlock.toggleClass("full-screen-scorm");
@@ -29,6 +29,13 @@ function ScormStudioXBlock(runtime, element) {
       type: "POST",
       success: function(response){
         runtime.notify('save', {state: 'end'});
+      },
+      error: function(xhr) {
+        var message = 'Unable to save the scorm package.';
+        try {
+          message = JSON.parse(xhr.responseText).message || message;
+        } catch (e) {}
+        runtime.notify('error', {title: 'Error', message: message});
       }
     });
 
@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 import json
+import os
+import shutil
+import tempfile
+import zipfile
 
 import mock
 import unittest
 
 from ddt import ddt, data
+from django.core.files.uploadedfile import SimpleUploadedFile
 from freezegun import freeze_time
 from xblock.field_data import DictFieldData
 
@@ -49,6 +54,7 @@ class ScormXBlockTests(unittest.TestCase):
             "file": None,
             "width": 800,
             "height": 450,
+            "open_in_pop_up": False,
         }
 
         block.studio_submit(mock.Mock(method="POST", params=fields))
@@ -60,6 +66,8 @@ class ScormXBlockTests(unittest.TestCase):
 
     @freeze_time("2018-05-01")
     @mock.patch("scormxblock.ScormXBlock.set_fields_xblock")
+    @mock.patch("scormxblock.scormxblock.CLEANUP_EXECUTOR")
+    @mock.patch("scormxblock.scormxblock.zipfile")
     @mock.patch("scormxblock.scormxblock.shutil")
     @mock.patch("scormxblock.scormxblock.SCORM_ROOT")
     @mock.patch("scormxblock.scormxblock.os")
@@ -67,28 +75,39 @@ class ScormXBlockTests(unittest.TestCase):
     @mock.patch(
         "scormxblock.ScormXBlock._file_storage_path", return_value="file_storage_path"
     )
-    @mock.patch("scormxblock.ScormXBlock.get_sha1", return_value="sha1")
+    @mock.patch(
+        "scormxblock.ScormXBlock._materialize_and_hash",
+        return_value=("zip_path", "sha1", "1234"),
+    )
     @mock.patch("scormxblock.ScormXBlock.s3_storage", return_value=True)
     def test_save_scorm_zipfile(
         self,
         s3_storage,
-        get_sha1,
+        materialize_and_hash,
         file_storage_path,
         default_storage,
         mock_os,
         SCORM_ROOT,
         shutil,
+        zipfile,
+        cleanup_executor,
         set_fields_xblock,
     ):
         block = self.make_one()
         mock_file_object = mock.Mock()
         mock_file_object.configure_mock(name="scorm_file_name", size="1234")
         default_storage.configure_mock(
+            bucket=None,
             size=mock.Mock(return_value="1234"),
             listdir=mock.Mock(side_effect=[(["dir_names"], ["files_names"]), ([], [])]),
         )
         mock_os.configure_mock(
-            path=mock.Mock(join=mock.Mock(return_value="path_join")),
+            sep="/",
+            path=mock.Mock(
+                join=mock.Mock(return_value="path_join"),
+                relpath=mock.Mock(return_value="file_names"),
+                basename=mock.Mock(return_value="file_names"),
+            ),
             walk=mock.Mock(return_value=[("path", ["dirs"], ["file_names"])]),
         )
 
@@ -98,6 +117,7 @@ class ScormXBlockTests(unittest.TestCase):
             "file": mock.Mock(file=mock_file_object),
             "width": None,
             "height": 450,
+            "open_in_pop_up": False,
         }
 
         with mock.patch(
@@ -113,19 +133,322 @@ class ScormXBlockTests(unittest.TestCase):
             "size": "1234",
         }
 
-        get_sha1.assert_called_once_with(mock_file_object)
+        materialize_and_hash.assert_called_once_with(mock_file_object)
         self.assertTrue(file_storage_path.called)
         self.assertTrue(default_storage.delete.called)
         self.assertTrue(default_storage.save.called)
+        self.assertEqual(
+            default_storage.save.call_args[0][0], "file_storage_path/file_names"
+        )
 
         self.assertEqual(block.scorm_file_meta, expected_scorm_file_meta)
 
         self.assertTrue(mock_os.path.join.called)
-        self.assertTrue(mock_os.path.exists.called)
 
-        self.assertEqual(shutil.rmtree.call_count, 2)
-        self.assertEqual(shutil.rmtree.call_args[0][0], "path_join")
-        self.assertTrue(set_fields_xblock.called_once)
+        self.assertEqual(mock_os.rename.call_count, 2)
+        self.assertEqual(mock_os.rename.call_args[0][0], "path_join")
+        self.assertTrue(mock_os.rename.call_args[0][1].startswith("path_join.trash."))
+        self.assertEqual(cleanup_executor.submit.call_count, 2)
+        cleanup_executor.submit.assert_called_with(
+            shutil.rmtree, mock_os.rename.call_args[0][1], ignore_errors=True
+        )
+        set_fields_xblock.assert_called_once()
+
+    @mock.patch("scormxblock.scormxblock.safe_join", create=True)
+    @mock.patch("scormxblock.scormxblock.clean_name", create=True)
+    @mock.patch("scormxblock.scormxblock.default_storage", location="media")
+    def test_delete_existing_files_in_bulk(self, default_storage, clean_name, safe_join):
+        block = self.make_one()
+        clean_name.side_effect = lambda name: name
+        safe_join.side_effect = lambda base, name: "/".join([base, name])
+
+        block._delete_existing_files("file_storage_path")
+
+        default_storage.bucket.objects.filter.assert_called_once_with(
+            Prefix="media/file_storage_path/"
+        )
+        default_storage.bucket.objects.filter.return_value.delete.assert_called_once_with()
+        self.assertFalse(default_storage.listdir.called)
+        self.assertFalse(default_storage.delete.called)
+
+    @mock.patch("scormxblock.scormxblock.safe_join", create=True)
+    @mock.patch("scormxblock.scormxblock.clean_name", create=True)
+    @mock.patch("scormxblock.scormxblock.create_transfer_manager", create=True)
+    @mock.patch("scormxblock.scormxblock.S3_TRANSFER_CONFIG")
+    @mock.patch("scormxblock.scormxblock.default_storage")
+    def test_store_files_with_transfer_manager(
+        self, default_storage, transfer_config, create_transfer_manager, clean_name, safe_join
+    ):
+        block = self.make_one()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        clean_name.side_effect = lambda name: name
+        safe_join.side_effect = lambda base, name: "/".join([base, name])
+        default_storage.configure_mock(
+            gzip=False,
+            location="media",
+            default_acl="public-read",
+            get_object_parameters=mock.Mock(
+                side_effect=lambda name: {"CacheControl": "max-age=60"}
+            ),
+        )
+        default_storage.bucket.name = "bucket"
+        transfer_manager = create_transfer_manager.return_value
+
+        with mock.patch("scormxblock.scormxblock.SCORM_ROOT", temp_dir):
+            os.makedirs(os.path.join(block.local_storage_path, "assets"))
+            for name in ["index.html", os.path.join("assets", "app.js")]:
+                with open(os.path.join(block.local_storage_path, name), "w") as local_file:
+                    local_file.write(name)
+
+            block._store_unziped_files_to_s3()
+
+        create_transfer_manager.assert_called_once_with(
+            default_storage.bucket.meta.client, transfer_config
+        )
+        transfer_manager.upload.assert_has_calls(
+            [
+                mock.call(
+                    os.path.join(block.local_storage_path, "index.html"),
+                    "bucket",
+                    "media/scormxblockmedia/org/course/block_id/index.html",
+                    extra_args={
+                        "CacheControl": "max-age=60",
+                        "ContentType": "text/html",
+                        "ACL": "public-read",
+                    },
+                ),
+                mock.call(
+                    os.path.join(block.local_storage_path, "assets", "app.js"),
+                    "bucket",
+                    "media/scormxblockmedia/org/course/block_id/assets/app.js",
+                    extra_args={
+                        "CacheControl": "max-age=60",
+                        "ContentType": mock.ANY,
+                        "ACL": "public-read",
+                    },
+                ),
+            ],
+            any_order=True,
+        )
+        self.assertEqual(transfer_manager.upload.return_value.result.call_count, 2)
+        self.assertFalse(default_storage.save.called)
+
+    @mock.patch("scormxblock.scormxblock.default_storage", gzip=True)
+    def test_no_transfer_manager_for_gzipped_storage(self, default_storage):
+        block = self.make_one()
+
+        self.assertIsNone(block._get_transfer_manager())
+
+    @data(
+        ("assets/index.html", ("text/html", None)),
+        ("assets/style.min.css.gz", ("text/css", "gzip")),
+        ("assets/.hidden", ("application/octet-stream", None)),
+        ("assets/LICENSE", ("application/octet-stream", None)),
+    )
+    def test_guess_type(self, value):
+        file_path, expected_type = value
+        block = self.make_one()
+
+        self.assertEqual(block._guess_type(file_path), expected_type)
+
+    @mock.patch("scormxblock.scormxblock.safe_join", create=True)
+    @mock.patch("scormxblock.scormxblock.clean_name", create=True)
+    @mock.patch("scormxblock.scormxblock.default_storage")
+    def test_transfer_one_keeps_object_parameters(self, default_storage, clean_name, safe_join):
+        block = self.make_one()
+        transfer_manager = mock.Mock()
+        clean_name.side_effect = lambda name: name
+        safe_join.side_effect = lambda base, name: "/".join([base, name])
+        default_storage.configure_mock(
+            location="media",
+            default_acl=None,
+            get_object_parameters=mock.Mock(return_value={"ContentType": "text/plain"}),
+        )
+        default_storage.bucket.name = "bucket"
+
+        block._transfer_one(transfer_manager, "/scorm/style.css.gz", "prefix", "/scorm")
+        default_storage.get_object_parameters.return_value = {}
+        block._transfer_one(transfer_manager, "/scorm/app.css.gz", "prefix", "/scorm")
+
+        transfer_manager.upload.assert_has_calls(
+            [
+                mock.call(
+                    "/scorm/style.css.gz",
+                    "bucket",
+                    "media/prefix/style.css.gz",
+                    extra_args={"ContentType": "text/plain"},
+                ),
+                mock.call(
+                    "/scorm/app.css.gz",
+                    "bucket",
+                    "media/prefix/app.css.gz",
+                    extra_args={"ContentType": "text/css", "ContentEncoding": "gzip"},
+                ),
+            ]
+        )
+
+    def test_materialize_and_hash(self):
+        block = self.make_one()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        scorm_file = SimpleUploadedFile("scorm.zip", b"testdata")
+
+        with mock.patch("scormxblock.scormxblock.SCORM_ROOT", temp_dir):
+            zip_path, sha1, size = block._materialize_and_hash(scorm_file)
+
+        self.assertEqual(zip_path, os.path.join(temp_dir, "scorm.zip"))
+        self.assertEqual(sha1, "44115646e09ab3481adc2b1dc17be10dd9cdaa09")
+        self.assertEqual(size, 8)
+        with open(zip_path, "rb") as zip_file:
+            self.assertEqual(zip_file.read(), b"testdata")
+
+    @data(
+        (
+            'xmlns="http://www.imsglobal.org/xsd/imscp_v1p1"',
+            "1.2",
+        ),
+        ("", "2004 3rd Edition"),
+    )
+    def test_parse_manifest(self, value):
+        namespace, version = value
+        block = self.make_one()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        manifest_path = os.path.join(temp_dir, "imsmanifest.xml")
+        with open(manifest_path, "w") as manifest:
+            manifest.write(
+                """<?xml version="1.0"?>
+                <manifest {namespace}>
+                  <metadata><schemaversion>{version}</schemaversion></metadata>
+                  <organizations><organization><title>Course</title></organization></organizations>
+                  <resources>
+                    <resource identifier="r1" href="shared/launch.html"><file href="a.js"/></resource>
+                    <resource identifier="r2" href="other.html"/>
+                  </resources>
+                </manifest>""".format(namespace=namespace, version=version)
+            )
+
+        resource, schemaversion = block._parse_manifest(manifest_path)
+
+        self.assertEqual(resource["href"], "shared/launch.html")
+        self.assertEqual(schemaversion, version)
+
+    @mock.patch("scormxblock.ScormXBlock._parse_manifest")
+    @data(
+        ("1.2", "SCORM_12"),
+        (" 1.2\n", "SCORM_12"),
+        ("1x2", "SCORM_2004"),
+        ("2004 4th Edition", "SCORM_2004"),
+        (None, "SCORM_12"),
+    )
+    def test_set_fields_xblock_version(self, value, parse_manifest):
+        schemaversion, version_scorm = value
+        block = self.make_one()
+        parse_manifest.return_value = ({"href": "index.htm"}, schemaversion)
+
+        block.set_fields_xblock()
+
+        self.assertEqual(block.version_scorm, version_scorm)
+        self.assertEqual(block.path_index_page, "index.htm")
+
+    def test_materialize_and_hash_without_scorm_root(self):
+        block = self.make_one()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        scorm_root = os.path.join(temp_dir, "scormxblockmedia")
+
+        with mock.patch("scormxblock.scormxblock.SCORM_ROOT", scorm_root):
+            zip_path, sha1, size = block._materialize_and_hash(
+                SimpleUploadedFile("scorm.zip", b"testdata")
+            )
+
+        self.assertEqual(zip_path, os.path.join(scorm_root, "scorm.zip"))
+        self.assertTrue(os.path.isfile(zip_path))
+
+    def test_extract_zip(self):
+        block = self.make_one()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        zip_path = os.path.join(temp_dir, "scorm.zip")
+        # MEDIA_ROOT is not necessarily a normalized path
+        local_path = temp_dir + "//block_id"
+        os.makedirs(local_path)
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            zip_file.writestr("imsmanifest.xml", "<manifest/>")
+            zip_file.writestr("assets/", "")
+            zip_file.writestr("assets/js/app.js", "var app;")
+            zip_file.writestr("../outside.txt", "outside")
+
+        block._extract_zip(zip_path, local_path)
+
+        with open(os.path.join(local_path, "imsmanifest.xml")) as manifest:
+            self.assertEqual(manifest.read(), "<manifest/>")
+        with open(os.path.join(local_path, "assets", "js", "app.js")) as app:
+            self.assertEqual(app.read(), "var app;")
+        self.assertFalse(os.path.exists(os.path.join(temp_dir, "outside.txt")))
+
+    def test_save_invalid_scorm_zipfile(self):
+        block = self.make_one()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        fields = {
+            "display_name": "Test Block",
+            "has_score": True,
+            "file": mock.Mock(file=SimpleUploadedFile("scorm.zip", b"not a zip")),
+            "width": None,
+            "height": 450,
+            "open_in_pop_up": False,
+        }
+
+        with mock.patch("scormxblock.scormxblock.SCORM_ROOT", temp_dir):
+            response = block.studio_submit(mock.Mock(method="POST", params=fields))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["result"], "error")
+        self.assertEqual(block.scorm_file_meta, {})
+        self.assertFalse(os.path.exists(os.path.join(temp_dir, "scorm.zip")))
+
+    def test_unpack_corrupted_files_keeps_previous_package(self):
+        block = self.make_one()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        zip_path = os.path.join(temp_dir, "scorm.zip")
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            zip_file.writestr("index.html", b"A" * 64)
+        # Corrupt the member content while keeping a valid central directory
+        with open(zip_path, "rb") as corrupted_zip:
+            content = corrupted_zip.read()
+        with open(zip_path, "wb") as corrupted_zip:
+            corrupted_zip.write(content.replace(b"A" * 64, b"B" * 64))
+
+        with mock.patch("scormxblock.scormxblock.SCORM_ROOT", temp_dir):
+            os.makedirs(block.local_storage_path)
+            with open(os.path.join(block.local_storage_path, "old.html"), "w") as old_file:
+                old_file.write("old")
+
+            with self.assertRaises(zipfile.BadZipFile):
+                block._unpack_files(zip_path)
+
+            self.assertEqual(os.listdir(block.local_storage_path), ["old.html"])
+            self.assertEqual(
+                os.listdir(os.path.dirname(block.local_storage_path)), ["block_id"]
+            )
+
+    @mock.patch("scormxblock.scormxblock.CLEANUP_EXECUTOR")
+    def test_delete_local_storage_sweeps_stale_copies(self, cleanup_executor):
+        block = self.make_one()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        stale_path = os.path.join(temp_dir, "org", "course", "block_id.trash.stale")
+        os.makedirs(stale_path)
+
+        with mock.patch("scormxblock.scormxblock.SCORM_ROOT", temp_dir):
+            block._delete_local_storage()
+
+        cleanup_executor.submit.assert_called_once_with(
+            shutil.rmtree, stale_path, ignore_errors=True
+        )
 
     def test_build_file_storage_path(self):
         block = self.make_one()
@@ -194,6 +517,25 @@ class ScormXBlockTests(unittest.TestCase):
             },
         )
 
+    def test_publish_grade_only_once(self):
+        block = self.make_one(lesson_status="passed", lesson_score=0.8, weight=2)
+
+        block.publish_grade()
+        block.publish_grade()
+
+        block.runtime.publish.assert_called_once_with(
+            block, "grade", {"value": 0.8, "max_value": 2}
+        )
+        self.assertEqual(block.published_grade, {"value": 0.8, "max_value": 2})
+
+        block.lesson_score = 1
+        block.publish_grade()
+
+        block.runtime.publish.assert_called_with(
+            block, "grade", {"value": 1, "max_value": 2}
+        )
+        self.assertEqual(block.runtime.publish.call_count, 2)
+
     @mock.patch(
         "scormxblock.ScormXBlock.get_completion_status",
         return_value="completion_status",
@@ -247,6 +589,65 @@ class ScormXBlockTests(unittest.TestCase):
             {"completion_status": "completion_status", "result": "success"},
         )
 
+    @mock.patch("scormxblock.ScormXBlock.publish_grade")
+    def test_set_status_with_buffered_values(self, publish_grade):
+        block = self.make_one(has_score=True, data_scorm={"cmi.core.lesson_location": 1})
+        value = {
+            "name": "cmi.core.lesson_status",
+            "value": "completed",
+            "values": {"cmi.core.lesson_location": 2, "cmi.suspend_data": "data"},
+        }
+
+        response = block.scorm_set_value(
+            mock.Mock(method="POST", body=json.dumps(value).encode("utf-8"))
+        )
+
+        publish_grade.assert_called_once_with()
+        self.assertEqual(block.lesson_status, "completed")
+        self.assertEqual(
+            block.data_scorm,
+            {"cmi.core.lesson_location": 2, "cmi.suspend_data": "data"},
+        )
+        self.assertEqual(response.json["completion_status"], "completed")
+
+    @mock.patch(
+        "scormxblock.ScormXBlock.get_completion_status",
+        return_value="completion_status",
+    )
+    def test_set_buffered_scorm_values(self, get_completion_status):
+        block = self.make_one(has_score=True, data_scorm={"cmi.location": 1})
+        value = {"values": {"cmi.location": 2, "cmi.suspend_data": [1, 2]}}
+
+        response = block.scorm_set_values(
+            mock.Mock(method="POST", body=json.dumps(value).encode("utf-8"))
+        )
+
+        get_completion_status.assert_called_once_with()
+
+        self.assertEqual(
+            block.data_scorm, {"cmi.location": 2, "cmi.suspend_data": [1, 2]}
+        )
+        self.assertEqual(
+            response.json,
+            {"completion_status": "completion_status", "result": "success"},
+        )
+
+    def test_completion_status_cache_is_reset_on_set(self):
+        block = self.make_one(version_scorm="SCORM_2004", has_score=False)
+        self.assertEqual(block.get_completion_status(), "not attempted")
+
+        response = block.scorm_set_value(
+            mock.Mock(
+                method="POST",
+                body=json.dumps(
+                    {"name": "cmi.success_status", "value": "passed"}
+                ).encode("utf-8"),
+            )
+        )
+
+        self.assertEqual(response.json["completion_status"], "passed")
+        self.assertEqual(block.get_completion_status(), "passed")
+
     @data(
         {"name": "cmi.core.lesson_status"},
         {"name": "cmi.completion_status"},